@@ -4,6 +4,76 @@ import sys
 import threading
 import time
 import hashlib
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+def calculate_checksums(blocks):
+    """
+    Calculates the checksums of a batch of blocks.
+    It is a module level function so that it can run in the processes of the hash_pool.
+
+    Args:
+        blocks (list): The contents of the blocks, in bytes.
+
+    Returns:
+        list: The SHA-256 checksums of the blocks, in the same order.
+    """
+    return [hashlib.sha256(block_content).hexdigest() for block_content in blocks]
+
+def encode_block_ranges(block_ids, max_length=None):
+    """
+    Encodes block ids as ranges (e.g. "1-5;8"), keeping only the ranges that fit in max_length characters.
+
+    Args:
+        block_ids (iterable): The ids of the blocks.
+        max_length (int): The maximum length of the encoded ranges, or None for no limit.
+
+    Returns:
+        tuple: The encoded ranges and the list of block ids they cover.
+    """
+    numbers = sorted(int(block_id) for block_id in block_ids)
+    ranges = []
+    covered = []
+
+    start = 0
+    while start < len(numbers):
+        end = start
+        while end + 1 < len(numbers) and numbers[end + 1] == numbers[end] + 1:
+            end += 1
+
+        block_range = str(numbers[start]) if start == end else f"{numbers[start]}-{numbers[end]}"
+        if max_length is not None and len(";".join(ranges + [block_range])) > max_length:
+            break
+
+        ranges.append(block_range)
+        covered.extend(str(number) for number in numbers[start:end + 1])
+        start = end + 1
+
+    return ";".join(ranges), covered
+
+def decode_block_ranges(block_ranges):
+    """
+    Decodes block ranges encoded by encode_block_ranges.
+
+    Args:
+        block_ranges (str): The encoded ranges.
+
+    Returns:
+        set: The block numbers covered by the ranges.
+
+    Raises:
+        ValueError: If a range is malformed.
+    """
+    numbers = set()
+    for block_range in block_ranges.split(';') if block_ranges else []:
+        first, _, last = block_range.partition('-')
+        first, last = int(first), int(last or first)
+        if first < 1 or last < first:
+            raise ValueError(f"invalid block range: {block_range}")
+        numbers.update(range(first, last + 1))
+    return numbers
 
 class FSNode:
     """
@@ -19,8 +89,15 @@ class FSNode:
         nodes_responsetime (dict): A dictionary to store the response times of other nodes.
         nodes_lookup (dict): A dictionary to store the IP addresses of other nodes.
         node_blocks (dict): A dictionary to store the blocks of a node.
-        blocks (dict): A dictionary to store the blocks of a file.
-        current_sending_blocks (dict): A dictionary to store the blocks that are currently being sent.
+        blocks (dict): A dictionary to store the blocks of a file that is being downloaded.
+        downloads (dict): A dictionary that maps the files being downloaded to their total number of blocks.
+        blocks_lock (threading.Lock): A lock used for thread synchronization in blocks and downloads dictionaries.
+        block_lookups (dict): A dictionary that maps requested files to an event set when the tracker replies with their blocks.
+        hash_pool (ProcessPoolExecutor): A pool of processes that calculates the checksums of batches of blocks.
+        hash_pool_lock (threading.Lock): A lock used to replace the hash_pool if one of its processes dies.
+        received_blocks (queue.Queue): A queue of received blocks waiting to be verified.
+        requested_blocks (queue.Queue): A queue of blocks requested by other nodes waiting to be sent.
+        pipeline_threads (list): The threads that verify the received blocks and send the requested blocks.
         exit (bool): A boolean value indicating whether the node should exit or not.
 
         TODO's:
@@ -30,6 +107,11 @@ class FSNode:
     
     def __init__(self, files_folder, tracker_domain, tracker_port):
         self.MAX_CHAR_BLOCK = 32
+        self.MAX_DATAGRAM_SIZE = 1024
+        self.PEER_BLOCK_TIMEOUT = 5
+        self.BLOCK_LOOKUP_TIMEOUT = 2
+        self.HASH_BATCH_SIZE = 1024
+        self.HASH_WORKERS = os.cpu_count()
         self.name = socket.gethostname() + ".cc2023"
         self.files_folder = files_folder
 
@@ -44,8 +126,16 @@ class FSNode:
 
         self.node_blocks = {}
         self.blocks = {}
+        self.downloads = {}
+
+        self.blocks_lock = threading.Lock()
+        self.block_lookups = {}
 
-        self.current_sending_blocks = {}
+        self.hash_pool = ProcessPoolExecutor(max_workers=self.HASH_WORKERS)
+        self.hash_pool_lock = threading.Lock()
+        self.received_blocks = queue.Queue()
+        self.requested_blocks = queue.Queue()
+        self.pipeline_threads = []
 
         self.exit = False
 
@@ -59,12 +149,32 @@ class FSNode:
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_socket.bind((self.name, self.tracker_port))
 
+        self.start_block_pipeline()
         threading.Thread(target=self.handle_node_chunks, daemon=True).start()
         threading.Thread(target=self.handle_tracker_chunks, daemon=True).start()
         th = threading.Thread(target=self.listen_for_requests, daemon=True)
         th.start()
         th.join()
 
+    def start_block_pipeline(self):
+        """
+        Starts the threads that verify the received blocks and send the requested blocks in batches.
+        """
+        for target in [self.verify_received_blocks, self.send_requested_blocks]:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.pipeline_threads.append(thread)
+
+    def stop_block_pipeline(self):
+        """
+        Stops the block pipeline threads, waiting for the batches they are handling, and shuts down the hash_pool.
+        """
+        self.received_blocks.put(None)
+        self.requested_blocks.put(None)
+        for thread in self.pipeline_threads:
+            thread.join()
+        self.hash_pool.shutdown()
+
     def connect_to_tracker(self):
         """
         Connects to the tracker server and registers the files of the FSNode.
@@ -105,6 +215,7 @@ class FSNode:
         If a FILE_FOUND message is received, it requests the download of the specified file.
         If a FILE_NOT_FOUND message is received, it prints a message indicating that the file was not found.
         If an invalid message is received, it prints a message indicating that the message is invalid.
+        A message split across chunks is kept until the rest of it arrives.
         """
         data = ""
         while not self.exit:
@@ -113,10 +224,10 @@ class FSNode:
 
             if '<' in data:
                 messages = data.split('<')
-                for message in messages:
+                for message in messages[:-1]:
                     if message:
                         threading.Thread(target=self.handle_tracker_message, args=(message,), daemon=True).start()
-                data = ""
+                data = messages[-1]
 
             if not chunk:
                 break
@@ -127,48 +238,93 @@ class FSNode:
 
         elif message.startswith("FILE_NOT_FOUND"):
             _, filename = message.split(" ", 1)
+            self.block_lookups.pop(filename, None)
             print(f"File '{filename}' not found in the network.")
 
         elif message.startswith("B_FOUND"):
-            self.register_blocks(message)
+            _, info = message.split(" ", 1)
+            filename, blocks = info.split("~", 1)
+            try:
+                self.register_blocks(filename, blocks)
+            except ValueError:
+                self.clear_node_blocks(filename)
+                print(f"Invalid blocks of the file {filename} received from the tracker.")
+            self.signal_block_lookup(filename)
 
         elif message.startswith("B_NOT_FOUND"):
             _, filename = message.split(' ', 1)
+            self.clear_node_blocks(filename)
+            self.signal_block_lookup(filename)
             print(f"Individual blocks of the file {filename} not found in the network.")
 
         elif message.startswith("ALREADY_FILE"):
             _, filename = message.split(' ', 1)
+            self.block_lookups.pop(filename, None)
             print(f"File {filename} already exists.")
 
         else:
             print("Invalid Message.")
 
-    def register_blocks(self, message):
+    def register_blocks(self, filename, blocks):
         """
-        Registers the blocks of a file.
+        Registers the blocks of a file held by other nodes, replacing the previously registered ones.
 
         Args:
-            message (str): The message containing the file information and blocks.
+            filename (str): The name of the file.
+            blocks (str): The nodes and the ranges of blocks they hold (e.g. "node1,1-5;8|node2,3").
 
         Returns:
             None
+
+        Raises:
+            ValueError: If the blocks are malformed, in which case nothing is registered.
         """
-        _, info = message.split(" ", 1)
-        file_and_blocks = info.split("~")
-        filename = file_and_blocks[0]
-        blocks = file_and_blocks[1].split(";")
+        node_blocks = {}
+        for entry in blocks.split("|"):
+            node, block_ranges = entry.split(",")
+            block_numbers = decode_block_ranges(block_ranges)
+            if not node or not block_numbers:
+                raise ValueError(f"invalid blocks entry: {entry}")
+            node_blocks[(node, filename)] = {str(number) for number in block_numbers}
+
+        self.clear_node_blocks(filename)
+        self.node_blocks.update(node_blocks)
+
+    def signal_block_lookup(self, filename):
+        """
+        Wakes up the download of a file waiting for the tracker to reply with its blocks.
+
+        Args:
+            filename (str): The name of the file.
 
-        for block in blocks:
-            node, block_id = block.split(",")
-            if (node, filename) not in self.node_blocks:
-                self.node_blocks[(node, filename)] = {block_id}
-            else:
-                self.node_blocks[(node, filename)].add(block_id)
+        Returns:
+            None
+        """
+        lookup = self.block_lookups.get(filename)
+        if lookup is not None:
+            lookup.set()
+
+    def clear_node_blocks(self, filename):
+        """
+        Removes the previously registered blocks of a file, so that only the latest tracker information is used.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            None
+        """
+        for key in [key for key in self.node_blocks if key[1] == filename]:
+            del self.node_blocks[key]
 
     def request_download(self, message):
         """
         Requests the download of a file from the fastest node.
 
+        The blocks that other downloaders already hold are requested from them instead,
+        and the fastest node is asked to skip those blocks. If the tracker doesn't reply with
+        the blocks of the file within BLOCK_LOOKUP_TIMEOUT, the whole file is requested from the fastest node.
+
         Args:
             message (str): The message containing the file information and node IPs.
 
@@ -184,9 +340,101 @@ class FSNode:
         if len(nodes_ip) > 1:
             fastest_node = self.get_fastest_node(nodes_ip)
 
-        self.send_node_message(f"DOWNLOAD_REQUEST,{filename}", fastest_node)
+        lookup = self.block_lookups.get(filename)
+        if lookup is not None and lookup.wait(self.BLOCK_LOOKUP_TIMEOUT):
+            peer_blocks = self.assign_peer_blocks(filename)
+        else:
+            print(f"Blocks of the file {filename} not received from the tracker, downloading it from {fastest_node}.")
+            peer_blocks = {}
+        self.block_lookups.pop(filename, None)
+
+        for block_id, node in peer_blocks.items():
+            try:
+                self.send_node_message(f"BLOCK_REQUEST,{filename},{block_id}", node)
+            except OSError:
+                print(f"Block {block_id} of file {filename} couldn't be requested from {node}.")
+
+        request = f"DOWNLOAD_REQUEST,{filename},"
+        max_length = self.MAX_DATAGRAM_SIZE - len(request.encode('utf-8')) - 1
+        skipped_ranges, _ = encode_block_ranges(peer_blocks, max_length)
+        self.send_node_message(request + skipped_ranges, fastest_node)
+
+        threading.Thread(target=self.recover_missing_blocks, args=(filename, fastest_node), daemon=True).start()
+
         return filename
 
+    def assign_peer_blocks(self, filename):
+        """
+        Chooses, for each block of a file held by other downloaders, the node it will be requested from.
+        Blocks are spread among the nodes that hold them, picking the least loaded one each time.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            dict: A dictionary that maps block ids to the node they will be requested from.
+        """
+        holders = {}
+        for (node, file), block_ids in self.node_blocks.items():
+            if file != filename or node == self.name:
+                continue
+            for block_id in block_ids:
+                holders.setdefault(block_id, []).append(node)
+
+        assigned = {}
+        load = {}
+        for block_id, nodes in holders.items():
+            node = min(nodes, key=lambda n: load.get(n, 0))
+            assigned[block_id] = node
+            load[node] = load.get(node, 0) + 1
+
+        return assigned
+
+    def recover_missing_blocks(self, filename, node_name):
+        """
+        Requests again from the given node the blocks of a file that didn't arrive, until the file is written.
+
+        Every PEER_BLOCK_TIMEOUT seconds without new blocks, the missing blocks are requested again,
+        whether they were expected from other downloaders or lost on the way. If no block arrived at all,
+        the whole file is requested again.
+
+        Args:
+            filename (str): The name of the file.
+            node_name (str): The name of the node that has the complete file.
+
+        Returns:
+            None
+        """
+        file_path = os.path.join(self.files_folder, filename)
+        received_blocks = 0
+
+        while True:
+            time.sleep(self.PEER_BLOCK_TIMEOUT)
+            if self.exit:
+                return
+
+            with self.blocks_lock:
+                total_blocks = self.downloads.get(filename)
+                missing_blocks = []
+                if total_blocks is not None:
+                    missing_blocks = [number for number in range(1, total_blocks + 1) if (filename, number) not in self.blocks]
+
+            if os.path.exists(file_path):
+                return
+
+            if total_blocks is None:
+                self.send_node_message(f"DOWNLOAD_REQUEST,{filename},", node_name)
+                print(f"File {filename} requested again from {node_name}")
+                continue
+
+            if total_blocks - len(missing_blocks) > received_blocks:
+                received_blocks = total_blocks - len(missing_blocks)
+                continue
+
+            for block_number in missing_blocks:
+                self.send_node_message(f"BLOCK_REQUEST,{filename},{block_number}", node_name)
+                print(f"Block {block_number} of file {filename} requested again from {node_name}")
+
     def get_fastest_node(self, nodes):
         """
         Returns the fastest node from the given list of nodes.
@@ -217,15 +465,15 @@ class FSNode:
         Handles incoming messages from other nodes.
 
         Receives messages over UDP socket and processes them, in another thread, based on their content.
-        The messages can be of different types, such as DOWNLOAD_REQUEST, DOWNLOAD_RESPONSE,
-        PING, PRESPONSE, or Invalid Message.
+        The messages can be of different types, such as DOWNLOAD_REQUEST, BLOCK_REQUEST, BLOCK,
+        CORRUPTED_BLOCK, PING, PRESPONSE, or Invalid Message.
 
         Returns:
             None
         """
         data = ""
         while not self.exit:
-            chunk, sender_address = self.udp_socket.recvfrom(1024)
+            chunk, sender_address = self.udp_socket.recvfrom(self.MAX_DATAGRAM_SIZE)
             data += chunk.decode('utf-8')
 
             if '<' in data:
@@ -242,23 +490,20 @@ class FSNode:
 
     def handle_node_message(self, message, node_name):
         if message.startswith("DOWNLOAD_REQUEST"):
-            _, filename = message.split(',')
-            self.send_file_blocks(filename, node_name)
+            _, filename, skipped_ranges = message.split(',')
+            self.send_file_blocks(filename, node_name, decode_block_ranges(skipped_ranges))
+
+        elif message.startswith("BLOCK_REQUEST"):
+            _, filename, block_number = message.split(',')
+            self.requested_blocks.put((filename, int(block_number), node_name))
 
         elif message.startswith("BLOCK"):
             _, filename, block_number, total_blocks, checksum, block_content = message.split('~')
-            if self.verify_block_checksum(filename, block_number, total_blocks, checksum, block_content, node_name):
-                self.blocks[(filename, int(block_number))] = block_content
-                self.send_tracker_message(f"GOT_BLOCK,{filename},{block_number}")
-
-            if block_number == total_blocks:
-                file_content = self.collect_file_blocks(filename, int(total_blocks))
-                self.send_tracker_message(f"DONE,{filename}")
-                self.write_file(filename, file_content, node_name)
+            self.received_blocks.put((filename, int(block_number), int(total_blocks), block_content.encode('utf-8'), node_name, checksum))
         
         elif message.startswith("CORRUPTED_BLOCK"):
             _, filename, block_number, total_blocks = message.split(',')
-            self.send_file_block(node_name, filename, block_number, total_blocks, checksum, block_content)
+            self.requested_blocks.put((filename, int(block_number), node_name))
         
         elif message.startswith("PING"):
             _, start_time = message.split(';')
@@ -287,63 +532,327 @@ class FSNode:
         total_blocks = (file_size + self.MAX_CHAR_BLOCK - 1) // self.MAX_CHAR_BLOCK
         return total_blocks
 
-    def calculate_checksum(self, block_content):
+    def send_file_blocks(self, filename, node_name, skipped_blocks):
         """
-        Calculates the checksum of a block.
+        Sends all blocks of a complete file to a node, except the ones it gets from other downloaders.
+
+        The file is read in batches and up to HASH_WORKERS batches are hashed in the hash_pool
+        at the same time, while the oldest one is being sent.
 
         Args:
-            block_content (str): The content of the block.
+            filename (str): The name of the file.
+            node_name (str): The name of the destination node.
+            skipped_blocks (set): The numbers of the blocks that must not be sent.
 
         Returns:
-            str: The checksum of the block.
+            None
         """
-        sha256 = hashlib.sha256()
-        sha256.update(block_content)
-        checksum = sha256.hexdigest()
-        return checksum
-
-    def send_file_blocks(self, filename, node_name):
         file_path = os.path.join(self.files_folder, filename)
         total_blocks = self.calculate_total_blocks(file_path)
 
+        pending = deque()
+        for batch in self.read_file_batches(file_path, total_blocks, skipped_blocks):
+            hashing = self.hash_blocks([(filename, number, total_blocks, content, node_name) for number, content in batch])
+            if hashing is None:
+                print(f"Sending of file {filename} to {node_name} interrupted, the node is exiting.")
+                return
+            pending.append(hashing)
+
+            while pending and (len(pending) >= self.HASH_WORKERS or pending[0][1].done()):
+                self.send_hashed_blocks(pending.popleft())
+
+        while pending:
+            self.send_hashed_blocks(pending.popleft())
+
+        print(f"All blocks of file {filename} sent to {node_name}")
+
+    def read_file_batches(self, file_path, total_blocks, skipped_blocks):
+        """
+        Reads a file in batches of HASH_BATCH_SIZE blocks, without reading the skipped blocks.
+
+        Args:
+            file_path (str): The path to the file.
+            total_blocks (int): The total number of blocks of the file.
+            skipped_blocks (set): The numbers of the blocks that must not be read.
+
+        Yields:
+            list: A list of (block_number, block_content) tuples.
+        """
         with open(file_path, 'rb') as file:
-            block_number = 1
-            while True:
-                block_content = file.read(self.MAX_CHAR_BLOCK)
-                if not block_content:
-                    break
+            batch = []
+            for block_number in range(1, total_blocks + 1):
+                if block_number in skipped_blocks:
+                    continue
+
+                file.seek((block_number - 1) * self.MAX_CHAR_BLOCK)
+                batch.append((block_number, file.read(self.MAX_CHAR_BLOCK)))
+
+                if len(batch) == self.HASH_BATCH_SIZE:
+                    yield batch
+                    batch = []
+
+            if batch:
+                yield batch
+
+    def hash_blocks(self, blocks):
+        """
+        Submits the checksum calculation of a batch of blocks to the hash_pool, as a single task.
+
+        Args:
+            blocks (list): A list of tuples whose fourth element is the content of the block, in bytes.
+
+        Returns:
+            tuple: The blocks and the future that resolves to their checksums, or None if the hash_pool was shut down.
+        """
+        contents = [block[3] for block in blocks]
+        hash_pool = self.hash_pool
+        try:
+            return blocks, hash_pool.submit(calculate_checksums, contents)
+        except BrokenProcessPool:
+            self.restart_hash_pool(hash_pool)
+        except RuntimeError:
+            return None
 
-                checksum = self.calculate_checksum(block_content)
-                self.current_sending_blocks[(filename, block_number)] = (block_content, checksum)
+        try:
+            return blocks, self.hash_pool.submit(calculate_checksums, contents)
+        except RuntimeError:
+            return None
+
+    def restart_hash_pool(self, broken_pool):
+        """
+        Replaces the hash_pool after one of its processes died, unless it was already replaced or the node is exiting.
+
+        Args:
+            broken_pool (ProcessPoolExecutor): The pool that failed.
+
+        Returns:
+            None
+        """
+        with self.hash_pool_lock:
+            if self.hash_pool is broken_pool and not self.exit:
+                print("A hashing process died, restarting the hash pool.")
+                self.hash_pool = ProcessPoolExecutor(max_workers=self.HASH_WORKERS)
+
+    def send_hashed_blocks(self, hashed_blocks):
+        """
+        Sends the blocks of a batch submitted to the hash_pool, once their checksums are calculated.
+
+        Args:
+            hashed_blocks (tuple): A list of (filename, block_number, total_blocks, block_content, node_name)
+                tuples and the future that resolves to their checksums.
 
+        Returns:
+            None
+        """
+        blocks, future = hashed_blocks
+        for (filename, block_number, total_blocks, block_content, node_name), checksum in zip(blocks, future.result()):
+            try:
                 message = f"BLOCK~{filename}~{block_number}~{total_blocks}~{checksum}~{block_content.decode('utf-8')}"
                 self.send_node_message(message, node_name)
                 print(f"Block {block_number}/{total_blocks} of file {filename} sent to {node_name}")
+            except Exception as error:
+                print(f"Block {block_number}/{total_blocks} of file {filename} couldn't be sent to {node_name}: {error}")
 
-                block_number += 1
+    def take_batch(self, blocks_queue, wait):
+        """
+        Takes up to HASH_BATCH_SIZE items from a queue.
 
-        print(f"All blocks of file {filename} sent to {node_name}")
+        Args:
+            blocks_queue (queue.Queue): The queue to take the items from.
+            wait (bool): Whether to wait for the first item or return right away if the queue is empty.
 
-    def send_file_block(self, node_name, filename, block_number, total_blocks):
-        block_content = self.current_sending_blocks[(filename, int(block_number))][0]
-        checksum = self.current_sending_blocks[(filename, int(block_number))][1]
+        Returns:
+            list: The items taken, or None if the pipeline was stopped.
+        """
+        batch = []
+        try:
+            while len(batch) < self.HASH_BATCH_SIZE:
+                item = blocks_queue.get(block=wait and not batch)
+                if item is None:
+                    return None
+                batch.append(item)
+        except queue.Empty:
+            pass
+        return batch
 
-        message = f"BLOCK~{filename}~{block_number}~{total_blocks}~{checksum}~{block_content.decode('utf-8')}"
-        self.send_node_message(message, node_name)
+    def run_block_pipeline(self, blocks_queue, prepare_batch, handle_batch):
+        """
+        Takes batches from a queue and submits their checksums to the hash_pool, keeping up to
+        HASH_WORKERS batches in flight and handling them in the order they were taken.
+        An error in a batch is reported and the batch dropped, so the pipeline keeps running.
 
-        print(f"Block {block_number}/{total_blocks} of file {filename} sent again to {node_name}")
+        Args:
+            blocks_queue (queue.Queue): The queue to take the items from.
+            prepare_batch (function): Turns the items taken into blocks to hash.
+            handle_batch (function): Handles a batch once its checksums are calculated.
 
-    def verify_block_checksum(self, filename, block_number, total_blocks, expected_checksum, received_content, node_name):
-        calculated_checksum = self.calculate_checksum(received_content.encode('utf-8'))
+        Returns:
+            None
+        """
+        pending = deque()
+        while True:
+            batch = self.take_batch(blocks_queue, not pending)
+
+            if batch:
+                try:
+                    blocks = prepare_batch(batch)
+                except Exception as error:
+                    print(f"Batch of {len(batch)} blocks dropped: {error}")
+                    blocks = []
+
+                if blocks:
+                    hashing = self.hash_blocks(blocks)
+                    if hashing is None:
+                        batch = None
+                    else:
+                        pending.append(hashing)
+
+            if batch is None:
+                while pending:
+                    self.handle_hashed_batch(handle_batch, pending.popleft())
+                return
+
+            while pending and pending[0][1].done():
+                self.handle_hashed_batch(handle_batch, pending.popleft())
+            if pending and (not batch or len(pending) >= self.HASH_WORKERS):
+                self.handle_hashed_batch(handle_batch, pending.popleft())
+
+    def handle_hashed_batch(self, handle_batch, hashed_blocks):
+        """
+        Handles a hashed batch, reporting the error if the batch fails.
+
+        Args:
+            handle_batch (function): Handles a batch once its checksums are calculated.
+            hashed_blocks (tuple): The blocks and the future that resolves to their checksums.
+
+        Returns:
+            None
+        """
+        try:
+            handle_batch(hashed_blocks)
+        except Exception as error:
+            print(f"Batch of {len(hashed_blocks[0])} blocks dropped: {error}")
+
+    def verify_received_blocks(self):
+        """
+        Verifies the received blocks in batches, storing the valid ones
+        and asking the sender to send the corrupted ones again.
+        """
+        self.run_block_pipeline(self.received_blocks, list, self.handle_verified_blocks)
+
+    def handle_verified_blocks(self, hashed_blocks):
+        """
+        Stores the blocks of a verified batch whose checksum matches the one sent with them.
+
+        Args:
+            hashed_blocks (tuple): A list of (filename, block_number, total_blocks, block_content, node_name, checksum)
+                tuples and the future that resolves to their calculated checksums.
+
+        Returns:
+            None
+        """
+        blocks, future = hashed_blocks
+        for (filename, block_number, total_blocks, block_content, node_name, expected_checksum), checksum in zip(blocks, future.result()):
+            try:
+                if checksum == expected_checksum:
+                    print(f"Block {block_number}/{total_blocks} of file {filename} verified successfully.")
+                    self.store_block(filename, block_number, total_blocks, block_content.decode('utf-8'), node_name)
+                else:
+                    print(f"Block {block_number}/{total_blocks} of file {filename} is corrupted, trying again!")
+                    self.send_node_message(f"CORRUPTED_BLOCK,{filename},{block_number},{total_blocks}", node_name)
+            except Exception as error:
+                print(f"Block {block_number}/{total_blocks} of file {filename} from {node_name} couldn't be handled: {error}")
+
+    def send_requested_blocks(self):
+        """
+        Sends the blocks requested by other nodes in batches.
+        """
+        self.run_block_pipeline(self.requested_blocks, self.read_requested_blocks, self.send_hashed_blocks)
+
+    def read_requested_blocks(self, requests):
+        """
+        Reads the blocks requested by other nodes.
+
+        A block is taken from the in-progress download store if the file is still being downloaded,
+        otherwise it is read from the complete file in the files_folder.
+        Requests for blocks that don't exist or can't be read are reported and left out.
+
+        Args:
+            requests (list): A list of (filename, block_number, node_name) tuples.
+
+        Returns:
+            list: A list of (filename, block_number, total_blocks, block_content, node_name) tuples.
+        """
+        blocks = []
+        for filename, block_number, node_name in requests:
+            with self.blocks_lock:
+                block_content = self.blocks.get((filename, block_number))
+                total_blocks = self.downloads.get(filename)
+
+            try:
+                if block_content is not None and total_blocks is not None:
+                    block_content = block_content.encode('utf-8')
+                else:
+                    file_path = os.path.join(self.files_folder, filename)
+                    if not os.path.exists(file_path):
+                        print(f"Block {block_number} of file {filename} requested by {node_name} is not available.")
+                        continue
+
+                    total_blocks = self.calculate_total_blocks(file_path)
+                    if not 1 <= block_number <= total_blocks:
+                        print(f"Block {block_number} of file {filename} requested by {node_name} doesn't exist.")
+                        continue
+
+                    with open(file_path, 'rb') as file:
+                        file.seek((block_number - 1) * self.MAX_CHAR_BLOCK)
+                        block_content = file.read(self.MAX_CHAR_BLOCK)
+            except OSError as error:
+                print(f"Block {block_number} of file {filename} requested by {node_name} couldn't be read: {error}")
+                continue
+
+            blocks.append((filename, block_number, total_blocks, block_content, node_name))
+
+        return blocks
+
+    def store_block(self, filename, block_number, total_blocks, block_content, node_name):
+        """
+        Stores a verified block in the in-progress download store, making it available to other nodes.
+        When the last missing block is stored, the file is assembled and written to the files_folder.
+
+        Args:
+            filename (str): The name of the file.
+            block_number (int): The number of the block.
+            total_blocks (int): The total number of blocks of the file.
+            block_content (str): The content of the block.
+            node_name (str): The name of the node that sent the block.
+
+        Returns:
+            None
+        """
+        with self.blocks_lock:
+            if filename not in self.downloads:
+                if os.path.exists(os.path.join(self.files_folder, filename)):
+                    return
+                self.downloads[filename] = total_blocks
+
+            if (filename, block_number) in self.blocks:
+                return
+
+            self.blocks[(filename, block_number)] = block_content
+            completed = all((filename, number) in self.blocks for number in range(1, total_blocks + 1))
+
+        self.send_tracker_message(f"GOT_BLOCK,{filename},{block_number}")
+
+        if completed:
+            file_content = self.collect_file_blocks(filename, total_blocks)
+            self.write_file(filename, file_content, node_name)
+            self.send_tracker_message(f"DONE,{filename}")
+
+            with self.blocks_lock:
+                for number in range(1, total_blocks + 1):
+                    del self.blocks[(filename, number)]
+                del self.downloads[filename]
 
-        if calculated_checksum == expected_checksum:
-            print(f"Block {block_number}/{total_blocks} of file {filename} verified successfully.")
-            return True
-        else:
-            print(f"Block {block_number}/{total_blocks} of file {filename} is corrupted, trying again!")
-            self.send_node_message(f"CORRUPTED_BLOCK,{filename},{block_number},{total_blocks}", node_name)
-            return False
-        
     def collect_file_blocks(self, filename, total_blocks):
         """
         Collects all blocks of a file from the network.
@@ -360,7 +869,6 @@ class FSNode:
             while (filename, block_number) not in self.blocks:
                 time.sleep(0.1)
             file_content += self.blocks[(filename, block_number)]
-            del self.blocks[(filename, block_number)]
         return file_content
 
     def write_file(self, filename, response, node_name):
@@ -414,7 +922,8 @@ class FSNode:
         The function continuously prompts the user for input commands until the user enters 'EXIT' to quit.
         If the user enters a command starting with 'GET', the function extracts the filename from the command
         and sends a tracker message with the command 'GET' and the filename.
-        If the user enters 'EXIT', the function sends a tracker message with the command 'EXIT' and closes the UDP socket.
+        If the user enters 'EXIT', the function sends a tracker message with the command 'EXIT', stops the block pipeline
+        and closes the UDP socket.
 
         Args:
             None
@@ -426,11 +935,13 @@ class FSNode:
             user_input = input("Enter command (e.g., 'GET <filename>' or 'EXIT' to quit): \n")
             if user_input.startswith("GET"):
                 filename = user_input[4:]
+                self.block_lookups[filename] = threading.Event()
                 self.send_tracker_message(f"GET,{filename}")
 
             elif user_input.upper() == "EXIT":
                 self.exit = True
                 self.send_tracker_message("EXIT")
+                self.stop_block_pipeline()
                 self.udp_socket.close()
 
     def send_tracker_message(self, message):
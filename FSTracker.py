@@ -2,6 +2,8 @@ import socket
 import sys
 import threading
 
+from FSNode import encode_block_ranges
+
 class FSTracker:
     """
     FSTracker class represents a file system tracker that keeps track of nodes and their files.
@@ -55,6 +57,7 @@ class FSTracker:
         """
         Handles the chunks received from a node socket.
         It uses threading to handle each message in a separate thread.
+        A message split across chunks is kept until the rest of it arrives.
 
         Args:
             node_socket (socket.socket): The socket object for the node.
@@ -70,11 +73,11 @@ class FSTracker:
 
             if '<' in data:
                 messages = data.split('<')
-                for message in messages:
+                for message in messages[:-1]:
                     if message:
                         threading.Thread(target=self.handle_node_message, args=(message, node_name, node_socket)).start()
 
-                data = ""
+                data = messages[-1]
 
             if not chunk:
                 break
@@ -93,7 +96,7 @@ class FSTracker:
         If the message starts with "EXIT", the node is removed from the tracker.
         If the message starts with "REGISTER", the node is registered with the tracker.
         If the message starts with "GET", the nodes that contain the file are sent to the node.
-        If the message starts with "GOT_BLOCK", the block is added to the node's blocks.
+        If the message starts with "GOT_BLOCK", the block is added to the node's blocks, unless the node already has the whole file.
         If the message starts with "DONE", the node is updated with the file it received.
 
         Returns:
@@ -104,6 +107,9 @@ class FSTracker:
             with self.files_lock:
                 if node_name in self.node_files:
                     del self.node_files[node_name]
+            with self.blocks_lock:
+                for key in [key for key in self.node_blocks if key[0] == node_name]:
+                    del self.node_blocks[key]
             node_socket.close()
             print("Node " + node_name + " exited.")
         
@@ -118,8 +124,13 @@ class FSTracker:
 
         elif message.startswith("GOT_BLOCK"):
             _, filename, block_id = message.split(',')
-            with self.blocks_lock:
-                if filename in self.node_blocks:
+            if not block_id.isdigit() or int(block_id) < 1:
+                print(f"Invalid block {block_id} of file {filename} from node {node_name}.")
+                return
+            with self.files_lock, self.blocks_lock:
+                if filename in self.node_files.get(node_name, set()):
+                    return
+                if (node_name, filename) in self.node_blocks:
                     self.node_blocks[(node_name, filename)].add(block_id)
                 else:
                     self.node_blocks[(node_name, filename)] = {block_id}
@@ -127,8 +138,6 @@ class FSTracker:
 
         elif message.startswith("DONE"):
             _, filename = message.split(',')
-            with self.blocks_lock:
-                del self.node_blocks[(node_name, filename)]
             self.update_node_files(node_name, filename)
             print(f"Node {node_name} has finished downloading file {filename}")
 
@@ -158,7 +167,8 @@ class FSTracker:
             node_socket (socket.socket): The socket used for communication with the node.
         """
         nodes_with_file = [node for node, files in self.node_files.items() if filename in files]
-        nodes_with_blocks = [(node, blocks) for (node, file), blocks in self.node_blocks.items() if filename == file]
+        with self.blocks_lock:
+            nodes_with_blocks = [(node, set(blocks)) for (node, file), blocks in self.node_blocks.items() if filename == file and node != node_name]
 
         if nodes_with_file:
             node_ip_result = ""
@@ -183,8 +193,8 @@ class FSTracker:
         if nodes_with_blocks:
             node_ip_result = ""
             for node, blocks in nodes_with_blocks:
-                for block in blocks:
-                    node_ip_result += f"{node},{block};"
+                block_ranges, _ = encode_block_ranges(blocks)
+                node_ip_result += f"{node},{block_ranges}|"
             node_ip_result = node_ip_result[:-1]
 
             response = f"B_FOUND {filename}~{node_ip_result}<"
@@ -198,17 +208,19 @@ class FSTracker:
 
     def update_node_files(self, node_name, filename):
         """
-        Updates the file list of a node after it has received a file.
+        Updates the file list of a node after it has received a file, and forgets the blocks of that file the node had.
+        Both locks are held, in the same order as in GOT_BLOCK, so a late GOT_BLOCK can't register the blocks again.
 
         Args:
             node_name (str): The name of the node.
             filename (str): The name of the file.
         """
-        with self.files_lock:
+        with self.files_lock, self.blocks_lock:
             if node_name in self.node_files:
                 self.node_files[node_name].add(filename)
             else:
                 self.node_files[node_name] = {filename}
+            self.node_blocks.pop((node_name, filename), None)
 
 if __name__ == "__main__":
     args = sys.argv[1:]
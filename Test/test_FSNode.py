@@ -0,0 +1,330 @@
+import hashlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FSNode import FSNode, decode_block_ranges, encode_block_ranges
+from FSTracker import FSTracker
+
+
+class FakeNetwork:
+    """
+    Delivers node messages directly to the destination FSNode, without sockets.
+    """
+
+    def __init__(self, folder, names):
+        self.nodes = {}
+        self.tracker_messages = {}
+        self.dropped = []
+        for name in names:
+            node = FSNode(os.path.join(folder, name), "tracker", 9090)
+            node.name = name
+            os.makedirs(node.files_folder)
+            self.tracker_messages[name] = []
+            node.send_tracker_message = self.tracker_messages[name].append
+            node.send_node_message = lambda message, destination, sender=name: \
+                self.deliver(message, sender, destination)
+            node.start_block_pipeline()
+            self.nodes[name] = node
+
+    def deliver(self, message, sender, destination):
+        """
+        Delivers a message, unless it is the first of the messages to drop.
+        Unknown destinations fail like an unresolvable host name.
+        """
+        if message in self.dropped:
+            self.dropped.remove(message)
+            return
+        if destination not in self.nodes:
+            raise socket.gaierror(f"Unknown node {destination}")
+        self.nodes[destination].handle_node_message(message, sender)
+
+    def close(self):
+        for node in self.nodes.values():
+            node.exit = True
+            node.stop_block_pipeline()
+
+
+class FakeTrackerSocket:
+    """
+    Replays the data sent by the tracker in chunks, like a TCP socket.
+    """
+
+    def __init__(self):
+        self.data = b""
+
+    def send(self, data):
+        self.data += data
+
+    def recv(self, size):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def wait_until(condition, timeout=5):
+    """
+    Waits until the block pipelines of the nodes make the condition true.
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Condition not met in time.")
+        time.sleep(0.01)
+
+
+class LazyFuture(Future):
+    """
+    A future that is never done until its result is asked for, so batches stay in flight.
+    """
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.function = function
+        self.args = args
+
+    def done(self):
+        return False
+
+    def result(self, timeout=None):
+        return self.function(*self.args)
+
+
+class LazyPool:
+    """
+    Replaces the hash_pool, counting the batches submitted.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, function, *args):
+        self.submitted += 1
+        return LazyFuture(function, *args)
+
+    def shutdown(self):
+        pass
+
+
+class NodesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.network = FakeNetwork(self.folder.name, ["seeder", "a", "b"])
+        self.seeder, self.a, self.b = (self.network.nodes[name] for name in ["seeder", "a", "b"])
+        self.content = "".join(chr(ord('a') + i % 26) for i in range(200))
+        with open(os.path.join(self.seeder.files_folder, "file"), 'w') as file:
+            file.write(self.content)
+
+    def tearDown(self):
+        self.network.close()
+        self.folder.cleanup()
+
+    def read(self, node, filename):
+        file_path = os.path.join(node.files_folder, filename)
+        wait_until(lambda: os.path.exists(file_path) and filename not in node.downloads)
+        with open(file_path) as file:
+            return file.read()
+
+
+class TestSwarming(NodesTestCase):
+
+    def test_assign_peer_blocks_spreads_load(self):
+        self.b.node_blocks = {
+            ("a", "file"): {"1", "2", "3", "4"},
+            ("seeder", "file"): {"1", "2", "3", "4"},
+            ("b", "file"): {"5"},
+            ("a", "other"): {"6"},
+        }
+
+        assigned = self.b.assign_peer_blocks("file")
+
+        self.assertEqual(set(assigned), {"1", "2", "3", "4"})
+        self.assertEqual(sorted(assigned.values()), ["a", "a", "seeder", "seeder"])
+
+    def test_block_ranges(self):
+        ranges, covered = encode_block_ranges(["7", "1", "2", "3", "5"], 100)
+
+        self.assertEqual(ranges, "1-3;5;7")
+        self.assertEqual(decode_block_ranges(ranges), {1, 2, 3, 5, 7})
+        self.assertEqual(sorted(covered, key=int), ["1", "2", "3", "5", "7"])
+        self.assertEqual(decode_block_ranges(""), set())
+
+        for block_ranges in ["", "0", "3-1", "1;", "a"]:
+            if block_ranges:
+                self.assertRaises(ValueError, decode_block_ranges, block_ranges)
+
+    def test_block_ranges_fit_in_datagram(self):
+        ranges, covered = encode_block_ranges(range(1, 2000, 2), 50)
+
+        self.assertLessEqual(len(ranges), 50)
+        self.assertEqual(decode_block_ranges(ranges), {int(block_id) for block_id in covered})
+
+    def test_long_tracker_reply_split_across_chunks(self):
+        tracker = FSTracker("tracker", 9090)
+        tracker.node_files = {"seeder": {"file"}}
+        tracker.node_blocks = {("a", "file"): {str(number) for number in range(1, 800, 2)}, ("c", "file"): {"2", "3"}}
+        self.b.tcp_socket = FakeTrackerSocket()
+        tracker.send_nodes_to_node("file", "b", self.b.tcp_socket)
+        self.assertGreater(len(self.b.tcp_socket.data), 1024)
+
+        self.b.PEER_BLOCK_TIMEOUT = 0.05
+        self.b.block_lookups["file"] = threading.Event()
+        self.b.handle_tracker_chunks()
+
+        self.assertEqual(self.read(self.b, "file"), self.content)
+        self.assertEqual(self.b.node_blocks[("a", "file")], tracker.node_blocks[("a", "file")])
+        self.assertEqual(self.b.node_blocks[("c", "file")], {"2", "3"})
+
+    def test_malformed_blocks_are_rejected(self):
+        self.b.node_blocks = {("a", "file"): {"1"}}
+        self.b.block_lookups["file"] = threading.Event()
+
+        self.b.handle_tracker_message("B_FOUND file~a,1;3|c,")
+
+        self.assertEqual(self.b.node_blocks, {})
+        self.assertTrue(self.b.block_lookups["file"].is_set())
+
+    def test_store_block_completes_out_of_order(self):
+        for block_number in [3, 1, 2, 2]:
+            self.a.store_block("file", block_number, 3, f"<{block_number}>", "seeder")
+
+        self.assertEqual(self.read(self.a, "file"), "<1><2><3>")
+        self.assertEqual(self.a.blocks, {})
+        self.assertEqual(self.a.downloads, {})
+        self.assertEqual(self.network.tracker_messages["a"],
+                         ["GOT_BLOCK,file,3", "GOT_BLOCK,file,1", "GOT_BLOCK,file,2", "DONE,file"])
+
+        self.a.store_block("file", 1, 3, "<1>", "seeder")
+        self.assertEqual(self.a.blocks, {})
+
+    def test_download_from_partial_holder(self):
+        total_blocks = self.seeder.calculate_total_blocks(os.path.join(self.seeder.files_folder, "file"))
+        self.seeder.send_file_blocks("file", "a", {total_blocks})
+        wait_until(lambda: len(self.a.blocks) == total_blocks - 1)
+        self.assertEqual(self.a.downloads, {"file": total_blocks})
+
+        for block_number in range(1, total_blocks):
+            self.a.handle_node_message(f"BLOCK_REQUEST,file,{block_number}", "b")
+        wait_until(lambda: len(self.b.blocks) == total_blocks - 1)
+
+        self.a.send_node_message(f"BLOCK_REQUEST,file,{total_blocks}", "seeder")
+        self.assertEqual(self.read(self.a, "file"), self.content)
+
+        self.a.handle_node_message(f"BLOCK_REQUEST,file,{total_blocks}", "b")
+        self.assertEqual(self.read(self.b, "file"), self.content)
+
+    def test_request_download_without_blocks_lookup(self):
+        self.b.BLOCK_LOOKUP_TIMEOUT = 0.01
+        self.b.block_lookups["file"] = threading.Event()
+
+        self.b.request_download("FILE_FOUND file~seeder")
+
+        self.assertEqual(self.b.block_lookups, {})
+        self.assertEqual(self.read(self.b, "file"), self.content)
+
+    def test_lost_blocks_are_requested_until_file_is_written(self):
+        total_blocks = self.seeder.calculate_total_blocks(os.path.join(self.seeder.files_folder, "file"))
+        self.network.dropped = ["DOWNLOAD_REQUEST,file,"] + [f"BLOCK_REQUEST,file,{total_blocks}"] * 2
+        self.seeder.send_file_blocks = lambda filename, node_name, skipped_blocks: \
+            type(self.seeder).send_file_blocks(self.seeder, filename, node_name, skipped_blocks | {total_blocks})
+        self.b.PEER_BLOCK_TIMEOUT = 0.05
+        self.b.block_lookups["file"] = threading.Event()
+        self.b.block_lookups["file"].set()
+
+        self.b.request_download("FILE_FOUND file~seeder")
+
+        self.assertEqual(self.read(self.b, "file"), self.content)
+        self.assertEqual(self.network.dropped, [])
+
+    def test_file_not_found_discards_blocks_lookup(self):
+        self.b.block_lookups["file"] = threading.Event()
+
+        self.b.handle_tracker_message("FILE_NOT_FOUND file")
+        self.b.handle_tracker_message("B_NOT_FOUND file")
+
+        self.assertEqual(self.b.block_lookups, {})
+
+
+class TestBlockPipeline(NodesTestCase):
+
+    def test_corrupted_block_is_sent_again(self):
+        self.a.handle_node_message("BLOCK~file~1~7~bad-checksum~corrupted", "seeder")
+
+        wait_until(lambda: ("file", 1) in self.a.blocks)
+        self.assertEqual(self.a.blocks[("file", 1)], self.content[:self.a.MAX_CHAR_BLOCK])
+
+    def test_send_after_pipeline_stopped(self):
+        self.seeder.stop_block_pipeline()
+
+        self.seeder.send_file_blocks("file", "a", set())
+
+        self.assertEqual(self.a.blocks, {})
+
+    def test_transfer_across_several_batches(self):
+        content = "".join(chr(ord('A') + i % 26) for i in range(40 * self.a.MAX_CHAR_BLOCK))
+        with open(os.path.join(self.seeder.files_folder, "big"), 'w') as file:
+            file.write(content)
+
+        self.seeder.HASH_BATCH_SIZE = 3
+        self.seeder.HASH_WORKERS = 4
+        self.seeder.hash_pool.shutdown()
+        self.seeder.hash_pool = LazyPool()
+        send_hashed_blocks = self.seeder.send_hashed_blocks
+        in_flight = []
+        self.seeder.send_hashed_blocks = lambda hashed_blocks: \
+            in_flight.append(self.seeder.hash_pool.submitted) or send_hashed_blocks(hashed_blocks)
+        self.a.HASH_BATCH_SIZE = 3
+
+        self.seeder.send_file_blocks("big", "a", set())
+
+        self.assertEqual(self.read(self.a, "big"), content)
+        self.assertEqual(self.seeder.hash_pool.submitted, 14)
+        self.assertEqual(in_flight[:3], [4, 5, 6])
+
+    def test_bad_block_requests_do_not_stop_pipeline(self):
+        for message, sender in [("BLOCK_REQUEST,file,0", "a"), ("BLOCK_REQUEST,file,99", "a"),
+                                ("CORRUPTED_BLOCK,missing,1,1", "a"), ("BLOCK_REQUEST,file,1", "ghost")]:
+            self.seeder.handle_node_message(message, sender)
+        wait_until(self.seeder.requested_blocks.empty)
+
+        self.seeder.handle_node_message("BLOCK_REQUEST,file,2", "a")
+
+        wait_until(lambda: ("file", 2) in self.a.blocks)
+        self.assertTrue(all(thread.is_alive() for thread in self.seeder.pipeline_threads))
+
+    def test_failing_block_does_not_stop_verification(self):
+        checksum = hashlib.sha256(b"x").hexdigest()
+        self.a.handle_node_message(f"BLOCK~no/such~1~1~{checksum}~x", "seeder")
+        self.seeder.handle_node_message("BLOCK_REQUEST,file,1", "a")
+
+        wait_until(lambda: ("file", 1) in self.a.blocks)
+        self.assertTrue(all(thread.is_alive() for thread in self.a.pipeline_threads))
+
+
+class TestTrackerBlocks(unittest.TestCase):
+
+    def test_got_block_accumulates_until_done(self):
+        tracker = FSTracker("tracker", 9090)
+
+        tracker.handle_node_message("GOT_BLOCK,file,1", "a", None)
+        tracker.handle_node_message("GOT_BLOCK,file,2", "a", None)
+        tracker.handle_node_message("GOT_BLOCK,other,1", "a", None)
+        tracker.handle_node_message("GOT_BLOCK,file,", "a", None)
+        self.assertEqual(tracker.node_blocks[("a", "file")], {"1", "2"})
+
+        tracker.handle_node_message("DONE,file", "a", None)
+        tracker.handle_node_message("GOT_BLOCK,file,3", "a", None)
+        self.assertNotIn(("a", "file"), tracker.node_blocks)
+        self.assertEqual(tracker.node_blocks[("a", "other")], {"1"})
+        self.assertEqual(tracker.node_files["a"], {"file"})
+
+
+if __name__ == "__main__":
+    unittest.main()